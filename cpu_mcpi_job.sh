@@ -56,6 +56,34 @@ else
 fi
 echo "Dependency check/installation attempt complete."
 
+# The library lands in the shared submit dir and is loaded by ranks on every node,
+# possibly of different CPU generations, so no -march=native: one build per ISA
+# level, and cpu_monte_carlo_pi.py loads the best one each node's CPU supports.
+# It falls back to NumPy if none was built. -ffp-contract=off keeps the compiler
+# from fusing x*x + y*y into an FMA, so every build gives the same --seed counts.
+KERNEL_SRC="mc_pi_kernel.c"
+declare -A KERNEL_ISA_FLAGS=(
+    [avx512]="-mavx512f -mavx2"
+    [avx2]="-mavx2"
+    [scalar]=""
+)
+echo "Building SIMD Monte Carlo kernels from ${KERNEL_SRC}..."
+if [ -f "${KERNEL_SRC}" ]; then
+    for isa in avx512 avx2 scalar; do
+        KERNEL_LIB="libmc_pi_kernel_${isa}.so"
+        # shellcheck disable=SC2086 # ISA flags are intentionally word-split
+        "${CC:-gcc}" -O3 -ffp-contract=off ${KERNEL_ISA_FLAGS[${isa}]} -shared -fPIC -o "${KERNEL_LIB}" "${KERNEL_SRC}"
+        BUILD_STATUS=$?
+        if [ $BUILD_STATUS -ne 0 ]; then
+            echo "WARNING: building ${KERNEL_LIB} failed with status ${BUILD_STATUS}. Nodes needing it will fall back to another build or NumPy."
+        else
+            echo "Successfully built ${KERNEL_LIB}."
+        fi
+    done
+else
+    echo "WARNING: ${KERNEL_SRC} not found. Skipping C kernel build."
+fi
+
 echo "--- Slurm Configuration ---"
 echo "SLURM_JOB_ID: ${SLURM_JOB_ID:-N/A (not in Slurm job)}"
 echo "SLURM_NNODES: ${SLURM_NNODES:-N/A}"
@@ -87,6 +115,11 @@ echo "Attempting to start system metrics logging on all allocated nodes via SSH
 if [ -n "$SLURM_JOB_NODELIST" ]; then
     NODE_LIST=$(scontrol show hostnames "$SLURM_JOB_NODELIST")
     echo "Target nodes for logging: ${NODE_LIST}"
+    # SSH launches run concurrently so N nodes cost one handshake of wall time, not N.
+    # Node names and PIDs are kept in indexed arrays and waited on in launch order,
+    # so the per-node result messages follow NODE_LIST.
+    LOGGER_LAUNCH_NODES=()
+    LOGGER_LAUNCH_PIDS=()
     for node in ${NODE_LIST}; do
         echo "Attempting to start logger on node: ${node}"
         REMOTE_METRICS_FILE="${JOB_OUTPUT_DIR}/system_metrics_${node}.csv"
@@ -105,7 +138,13 @@ if [ -n "$SLURM_JOB_NODELIST" ]; then
         REMOTE_COMMAND="export PYTHONPATH=${USER_LOCAL_SITE_PACKAGES}${PYTHONPATH:+:$PYTHONPATH}; nohup ${REMOTE_PYTHON_INTERPRETER} ${ABS_LOG_SCRIPT_PATH} --output ${REMOTE_METRICS_FILE} --interval ${SYSTEM_METRICS_INTERVAL} > ${REMOTE_LOGGER_STDOUT} 2> ${REMOTE_LOGGER_STDERR} &"
         
         echo "Executing on ${node}: ${REMOTE_COMMAND}" # Added for better debugging
-        ssh -n -f "${node}" "${REMOTE_COMMAND}"
+        ssh -n -f "${node}" "${REMOTE_COMMAND}" &
+        LOGGER_LAUNCH_NODES+=("${node}")
+        LOGGER_LAUNCH_PIDS+=($!)
+    done
+    for i in "${!LOGGER_LAUNCH_NODES[@]}"; do
+        node="${LOGGER_LAUNCH_NODES[$i]}"
+        wait "${LOGGER_LAUNCH_PIDS[$i]}"
         SSH_EXIT_CODE=$?
         if [ ${SSH_EXIT_CODE} -eq 0 ]; then
             echo "Logger launch command sent to ${node} successfully."
@@ -1,51 +1,327 @@
 import time
 import argparse
 import random
-from multiprocessing import Pool, cpu_count
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from mpi4py import MPI
 import math
 import os
+import ctypes
+import threading
+import importlib.util
 import numpy as np # For efficient random number generation
 
-def monte_carlo_pi_batch(num_samples_in_batch):
+# numba is only used by --kernel numba, so it is imported by _numba_kernel() on
+# first use rather than here: the import alone costs every rank ~0.3 s.
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
+numba = None
+
+# libmc_pi_kernel_<isa>.so builds from cpu_mcpi_job.sh, best first, with the
+# /proc/cpuinfo flags each one needs. The library sits on the shared filesystem
+# and nodes may differ in CPU generation, so each rank picks for its own CPU.
+C_KERNEL_BUILDS = (
+    ('avx512', {'avx512f', 'avx2'}),
+    ('avx2', {'avx2'}),
+    ('scalar', set()),
+)
+
+def _cpu_flags():
+    """ISA flags of this node's CPU from /proc/cpuinfo (empty if unreadable)."""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+def _load_c_kernel():
+    """
+    Loads the best build of the SIMD kernels from mc_pi_kernel.c (next to this
+    script) that this CPU can run. Returns None if none has been built.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    cpu_flags = _cpu_flags()
+    candidates = [f'libmc_pi_kernel_{isa}.so' for isa, needed in C_KERNEL_BUILDS if needed <= cpu_flags]
+    for lib_name in candidates:
+        try:
+            lib = ctypes.CDLL(os.path.join(script_dir, lib_name))
+            break
+        except OSError:
+            continue
+    else:
+        return None
+    f32_array = np.ctypeslib.ndpointer(dtype=np.float32, flags='C_CONTIGUOUS')
+    lib.count_in_circle.argtypes = [f32_array, f32_array, ctypes.c_size_t]
+    lib.count_in_circle.restype = ctypes.c_uint64
+    lib.count_in_circle_rng.argtypes = [ctypes.c_uint64, ctypes.c_uint64]
+    lib.count_in_circle_rng.restype = ctypes.c_uint64
+    lib.mc_pi_kernel_isa.argtypes = []
+    lib.mc_pi_kernel_isa.restype = ctypes.c_char_p
+    return lib
+
+C_KERNEL = _load_c_kernel()
+
+# Samples drawn per NumPy call. Bounds the (2, n) float32 scratch array to 8 MiB
+# per worker no matter how large a batch is. Also used as the work unit of the
+# Numba kernel, so its results do not depend on the thread count.
+MC_CHUNK_SIZE = 1 << 20
+
+def _mc_pi_numba_impl(num_samples, chunk_seeds):
+    """
+    Counts points in the quarter circle, one prange iteration per seeded chunk.
+    Compiled with numba.njit by _numba_kernel().
+    """
+    num_chunks = chunk_seeds.shape[0]
+    samples_per_chunk = num_samples // num_chunks
+    remainder = num_samples % num_chunks
+    points_in_circle = 0
+    for c in numba.prange(num_chunks):
+        # Numba keeps one generator per thread; reseeding at the start of each
+        # chunk makes the chunk's stream independent of which thread runs it.
+        np.random.seed(chunk_seeds[c])
+        n = samples_per_chunk + (1 if c < remainder else 0)
+        inside = 0
+        for _ in range(n):
+            x = np.random.random()
+            y = np.random.random()
+            if x*x + y*y <= 1.0:
+                inside += 1
+        points_in_circle += inside
+    return points_in_circle
+
+_mc_pi_numba = None
+
+def _numba_kernel():
+    """Imports numba and compiles _mc_pi_numba_impl on first use; returns the kernel."""
+    global numba, _mc_pi_numba
+    if _mc_pi_numba is None:
+        import numba
+        _mc_pi_numba = numba.njit(parallel=True, fastmath=True, cache=True)(_mc_pi_numba_impl)
+    return _mc_pi_numba
+
+def _as_seed_sequence(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+def _monte_carlo_pi_c(num_samples_in_batch, seed=None):
+    """Fused xoshiro256+ generation and circle test in libmc_pi_kernel_<isa>.so."""
+    seed64 = int(_as_seed_sequence(seed).generate_state(1, dtype=np.uint64)[0])
+    return int(C_KERNEL.count_in_circle_rng(num_samples_in_batch, seed64))
+
+def _monte_carlo_pi_numba(num_samples_in_batch, seed=None):
+    """Runs the threaded Numba kernel with one derived seed per MC_CHUNK_SIZE chunk."""
+    num_chunks = max(1, -(-num_samples_in_batch // MC_CHUNK_SIZE))
+    chunk_seeds = _as_seed_sequence(seed).generate_state(num_chunks)
+    return int(_numba_kernel()(num_samples_in_batch, chunk_seeds))
+
+_thread_buffers = threading.local()
+
+def _sample_buffers(num_samples):
+    """
+    Returns this thread's (2, n) float32 scratch array with n >= num_samples,
+    allocating or growing it only when needed so batches reuse the same pages.
+    """
+    xy = getattr(_thread_buffers, 'xy', None)
+    if xy is None or xy.shape[1] < num_samples:
+        xy = _thread_buffers.xy = np.empty((2, num_samples), dtype=np.float32)
+    return xy
+
+def _monte_carlo_pi_numpy(num_samples_in_batch, seed=None):
+    """
+    Vectorized NumPy implementation of monte_carlo_pi_batch. Samples are FP32, as
+    in the C kernel (see the mc_pi_kernel.c header for why). The in-circle count
+    uses the SIMD count_in_circle kernel when a libmc_pi_kernel_<isa>.so build is
+    loaded.
+    """
+    rng = np.random.default_rng(seed)
+    xy = _sample_buffers(min(num_samples_in_batch, MC_CHUNK_SIZE))
+    points_in_circle = 0
+    samples_left = num_samples_in_batch
+    while samples_left > 0:
+        chunk = min(samples_left, MC_CHUNK_SIZE)
+        # Row slices stay contiguous for the C kernel
+        x, y = xy[0, :chunk], xy[1, :chunk]
+        rng.random(dtype=np.float32, out=x)
+        rng.random(dtype=np.float32, out=y)
+        if C_KERNEL is not None:
+            points_in_circle += int(C_KERNEL.count_in_circle(x, y, chunk))
+        else:
+            # Squared radius test: no sqrt needed on non-negative operands.
+            # Computed in place since the samples are not needed afterwards.
+            np.multiply(x, x, out=x)
+            np.multiply(y, y, out=y)
+            x += y
+            points_in_circle += int(np.count_nonzero(x <= np.float32(1.0)))
+        samples_left -= chunk
+    return points_in_circle
+
+def _monte_carlo_pi_python(num_samples_in_batch, seed=None):
+    """
+    Pure Python reference implementation of monte_carlo_pi_batch. Holds the GIL,
+    so it is only useful as a baseline or when NumPy itself is unusable.
+    """
+    # Bound method in a local: random() skips uniform()'s scaling and the
+    # attribute lookup per call; adding the bool avoids a branch per sample.
+    _rand = random.Random(int(_as_seed_sequence(seed).generate_state(1)[0])).random
+    points_in_circle = 0
+    for _ in range(num_samples_in_batch):
+        x = _rand()
+        y = _rand()
+        points_in_circle += (x*x + y*y <= 1.0)
+    return points_in_circle
+
+_KERNEL_FUNCS = {
+    'c': _monte_carlo_pi_c,
+    'numba': _monte_carlo_pi_numba,
+    'numpy': _monte_carlo_pi_numpy,
+    'python': _monte_carlo_pi_python,
+}
+
+def resolve_kernel(requested='auto'):
+    """
+    Maps a --kernel choice to an implementation that is actually available:
+    'c' (fused RNG + test in libmc_pi_kernel_<isa>.so), 'numba', 'numpy' or 'python'.
+    'auto', or a choice whose dependency is missing, picks the first available in
+    order of measured per-core speed: c, numpy, numba, python. The numba kernel draws
+    one scalar MT19937 number per coordinate, which does not vectorize, so it runs
+    behind the FP32 NumPy path and is only used when asked for.
+    """
+    available = [name for name, ok in (('c', C_KERNEL is not None),
+                                       ('numpy', True),
+                                       ('numba', NUMBA_AVAILABLE),
+                                       ('python', True)) if ok]
+    return requested if requested in available else available[0]
+
+def describe_kernel(kernel):
+    """Human readable kernel name for the run banner."""
+    if kernel == 'c':
+        return f"C fused xoshiro256+ FP32 ({C_KERNEL.mc_pi_kernel_isa().decode()})"
+    if kernel == 'numba':
+        return "numba (threaded)"
+    if kernel == 'python':
+        return "pure Python"
+    if C_KERNEL is not None:
+        return f"numpy FP32 + C count_in_circle ({C_KERNEL.mc_pi_kernel_isa().decode()})"
+    return "numpy FP32"
+
+def monte_carlo_pi_batch(num_samples_in_batch, seed=None, kernel='auto'):
     """
     Performs a batch of Monte Carlo samples to estimate Pi.
     Generates random points in a 1x1 square and counts how many fall
     within a quarter circle of radius 1.
     Pi is then estimated as 4 * (points_in_circle / total_points).
+
+    `kernel` is resolved with resolve_kernel(): the fused C kernel, the threaded
+    Numba kernel or vectorized NumPy chunks of at most MC_CHUNK_SIZE samples.
+    `seed` is anything accepted by np.random.SeedSequence (typically a spawned
+    SeedSequence) so that every batch draws from an independent stream.
     """
-    points_in_circle = 0
-    # Using numpy for potentially faster random number generation in a batch
-    # For very large num_samples_in_batch, this can be more efficient than a loop of random.random()
-    # However, for many small calls, the overhead might not be worth it.
-    # We'll stick to a loop for simplicity and to ensure CPU work per sample.
-    for _ in range(num_samples_in_batch):
-        x = random.uniform(0, 1)
-        y = random.uniform(0, 1)
-        if math.sqrt(x*x + y*y) <= 1.0:
-            points_in_circle += 1
-    return points_in_circle
+    return _KERNEL_FUNCS[resolve_kernel(kernel)](num_samples_in_batch, seed)
+
+# Samples per CuPy draw: 512 MiB of FP32 (x, y) pairs on the device
+GPU_CHUNK_SIZE = 1 << 26
+
+def _load_cupy():
+    """Returns the cupy module if it is installed and can see a GPU, else None."""
+    try:
+        import cupy
+        if cupy.cuda.runtime.getDeviceCount() > 0:
+            return cupy
+    except Exception: # ImportError, or a CUDA runtime error on GPU-less nodes
+        pass
+    return None
+
+def monte_carlo_pi_gpu(num_samples, seed=None):
+    """
+    CuPy version of monte_carlo_pi_batch for ranks with a GPU. Points are FP32 like
+    the CPU kernels, and the count is kept on the device so there is a single host
+    sync at the end.
+    """
+    import cupy as cp
+    rng = cp.random.default_rng(int(_as_seed_sequence(seed).generate_state(1)[0]))
+    points_in_circle = cp.zeros((), dtype=cp.int64)
+    samples_left = num_samples
+    while samples_left > 0:
+        chunk = min(samples_left, GPU_CHUNK_SIZE)
+        xy = rng.random((2, chunk), dtype=cp.float32)
+        x, y = xy[0], xy[1]
+        points_in_circle += cp.count_nonzero(x*x + y*y <= 1.0)
+        samples_left -= chunk
+    return int(points_in_circle)
+
+def local_worker_count():
+    """
+    Number of worker threads for this rank: SLURM_CPUS_PER_TASK, else
+    OMP_NUM_THREADS, else every CPU this process may run on. Always capped to
+    that CPU count so many ranks per node cannot oversubscribe it.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        usable_cpus = len(os.sched_getaffinity(0))
+    else:
+        usable_cpus = os.cpu_count() or 1
+    for var in ('SLURM_CPUS_PER_TASK', 'OMP_NUM_THREADS'):
+        try:
+            # OMP_NUM_THREADS may be a nested list such as "8,2"
+            requested = int(os.getenv(var, '').split(',')[0])
+        except ValueError:
+            continue
+        if requested > 0:
+            return min(requested, usable_cpus)
+    return max(1, usable_cpus)
+
+def reduce_rank_results(comm, points_in_circle, num_samples):
+    """
+    Sums (points_in_circle, num_samples) over all ranks onto rank 0 with a single
+    16-byte buffer Reduce. Returns the int64 totals on rank 0 and None elsewhere.
+    """
+    sendbuf = np.array([points_in_circle, num_samples], dtype=np.int64)
+    recvbuf = np.zeros(2, dtype=np.int64) if comm.Get_rank() == 0 else None
+    comm.Reduce([sendbuf, MPI.INT64_T],
+                [recvbuf, MPI.INT64_T] if recvbuf is not None else None,
+                op=MPI.SUM, root=0)
+    return recvbuf
 
 def main():
-    parser = argparse.ArgumentParser(description="CPU-intensive Monte Carlo Pi estimation using MPI and multiprocessing.")
+    parser = argparse.ArgumentParser(description="CPU-intensive Monte Carlo Pi estimation using MPI and threads.")
     parser.add_argument('--total-samples', type=int, default=int(4e9), help='Total number of samples to generate across all processes.')
-    parser.add_argument('--mp-batch-size', type=int, default=10**5, help='Number of samples processed by each multiprocessing worker in a single call.')
+    parser.add_argument('--mp-batch-size', type=int, default=10**5, help='Ranks with fewer than 10x this many samples skip the worker threads and run serially.')
+    parser.add_argument('--kernel', choices=['auto', *_KERNEL_FUNCS], default='auto', help='Monte Carlo implementation. auto prefers the fused C kernel (libmc_pi_kernel_<isa>.so), then numpy (faster per core than numba, which is only used when requested); python is the pure-Python baseline.')
+    parser.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='cuda runs each rank on a GPU via CuPy (falls back to cpu if CuPy or a GPU is unavailable).')
+    parser.add_argument('--seed', type=int, default=None, help='Root seed for reproducible runs. Each (rank, worker) gets an independent child stream. Default: fresh entropy, printed so the run can be repeated.')
     args = parser.parse_args()
+    if args.seed is not None and args.seed < 0:
+        parser.error('--seed must be a non-negative integer') # SeedSequence rejects negative entropy
+    kernel = resolve_kernel(args.kernel)
 
     comm = MPI.COMM_WORLD
     rank = comm.Get_rank()
     size = comm.Get_size() # Total number of MPI processes
+    # Node-local rank, used to spread a node's ranks over its GPUs. Split_type is
+    # collective, so every rank calls it before any early return.
+    local_rank = comm.Split_type(MPI.COMM_TYPE_SHARED).Get_rank() if args.device == 'cuda' else 0
+
+    # All ranks share one root entropy so a run is reproducible from a single number
+    root_entropy = args.seed
+    if root_entropy is None:
+        root_entropy = comm.bcast(np.random.SeedSequence().entropy if rank == 0 else None, root=0)
 
-    num_local_workers = int(os.getenv('SLURM_CPUS_PER_TASK', cpu_count()))
-    if num_local_workers <= 0:
-        num_local_workers = 1
+    num_local_workers = local_worker_count()
+    min_samples_for_threads = 10 * args.mp_batch_size
 
     if rank == 0:
         print(f"--- Monte Carlo Pi Estimation ---", flush=True)
         print(f"MPI World Size (Total MPI Ranks): {size}", flush=True)
         print(f"Total samples to generate: {args.total_samples}", flush=True)
-        print(f"Multiprocessing batch size per worker: {args.mp_batch_size}", flush=True)
-        print(f"Multiprocessing workers per MPI rank: ~{num_local_workers}", flush=True)
+        print(f"Serial threshold (samples per rank): {min_samples_for_threads}", flush=True)
+        print(f"Worker threads per MPI rank: ~{num_local_workers}", flush=True)
+        if args.kernel not in ('auto', kernel):
+            print(f"Warning: --kernel {args.kernel} is not available, using {kernel}.", flush=True)
+        print(f"Monte Carlo kernel: {describe_kernel(kernel)}", flush=True)
+        print(f"Requested device: {args.device}", flush=True)
+        print(f"Root seed: {root_entropy}", flush=True)
         print(f"--- Starting Simulation ---", flush=True)
 
     # Distribute the total samples among MPI processes
@@ -60,10 +336,8 @@ def main():
 
     if my_samples == 0:
         print(f"Rank {rank}: No samples to process.", flush=True)
-        comm.Barrier()
-        # Gather 0 points in circle and 0 total samples for this rank
-        rank_results = (0, 0)
-        all_rank_results = comm.gather(rank_results, root=0)
+        # Contribute 0 points in circle and 0 total samples for this rank
+        reduce_rank_results(comm, 0, 0)
         if rank == 0:
              print("\n--- Results ---", flush=True)
              print("No samples processed by any rank.", flush=True)
@@ -71,53 +345,70 @@ def main():
 
 
     rank_local_points_in_circle = 0
+    # Same as SeedSequence(root_entropy).spawn(size)[rank] without building all P
+    # children. Worker batches below spawn independent streams from it.
+    rank_seed_seq = np.random.SeedSequence(root_entropy, spawn_key=(rank,))
+
+    use_gpu = False
+    if args.device == 'cuda':
+        cp = _load_cupy()
+        if cp is None:
+            print(f"Rank {rank}: --device cuda requested but CuPy or a GPU is unavailable. Running on CPU.", flush=True)
+        else:
+            cp.cuda.Device(local_rank % cp.cuda.runtime.getDeviceCount()).use()
+            use_gpu = True
+    if kernel == 'numba' and not use_gpu:
+        # JIT compile (or load the on-disk cache) before the timed region, so the
+        # rank's reported time covers only the sampling.
+        _monte_carlo_pi_numba(1, 0)
     start_time_rank_work = time.time()
 
-    if num_local_workers > 1 and my_samples > args.mp_batch_size : # Use multiprocessing if beneficial
+    if use_gpu:
+        workers_used = "GPU"
+        rank_local_points_in_circle = monte_carlo_pi_gpu(my_samples, rank_seed_seq)
+    elif kernel == 'numba':
+        # The parallel kernel threads across this rank's cores itself, so a single
+        # call covers the whole rank.
+        numba.set_num_threads(min(num_local_workers, numba.config.NUMBA_NUM_THREADS))
+        workers_used = f"{numba.get_num_threads()} numba threads"
+        rank_local_points_in_circle = monte_carlo_pi_batch(my_samples, rank_seed_seq, kernel)
+    elif num_local_workers > 1 and my_samples >= min_samples_for_threads: # Use worker threads if beneficial
+        workers_used = f"{num_local_workers} threads"
+        # The C and NumPy kernels release the GIL while they work, so threads in
+        # this process scale across cores without forking or pickling.
         try:
-            pool = Pool(processes=num_local_workers)
-            
-            # Create a list of batch sizes for the workers
-            # Each element in batches_for_pool is the number of samples for one call to monte_carlo_pi_batch
-            num_full_batches = my_samples // args.mp_batch_size
-            remaining_for_last_batch = my_samples % args.mp_batch_size
-            
-            batches_for_pool = [args.mp_batch_size] * num_full_batches
-            if remaining_for_last_batch > 0:
-                batches_for_pool.append(remaining_for_last_batch)
-
-            if batches_for_pool:
-                # Each call to monte_carlo_pi_batch returns the count of points in circle for that batch
-                results_from_pool = pool.map(monte_carlo_pi_batch, batches_for_pool)
+            # One batch per worker: a few large tasks instead of many small ones.
+            # monte_carlo_pi_batch still works through each batch in MC_CHUNK_SIZE pieces.
+            samples_per_worker = my_samples // num_local_workers
+            remainder_for_workers = my_samples % num_local_workers
+            batches_for_pool = [samples_per_worker + (1 if i < remainder_for_workers else 0)
+                                for i in range(num_local_workers)]
+
+            # Each call to monte_carlo_pi_batch returns the count of points in circle for that batch
+            batch_seeds = rank_seed_seq.spawn(num_local_workers)
+            with ThreadPoolExecutor(max_workers=num_local_workers) as executor:
+                results_from_pool = executor.map(monte_carlo_pi_batch, batches_for_pool, batch_seeds, repeat(kernel))
                 rank_local_points_in_circle = sum(results_from_pool)
-            
-            pool.close()
-            pool.join()
         except Exception as e:
-            print(f"Rank {rank}: Error during multiprocessing: {e}. Falling back to serial.", flush=True)
+            print(f"Rank {rank}: Error in worker threads: {e}. Falling back to serial.", flush=True)
             # Fallback to serial execution for this rank's samples
-            rank_local_points_in_circle = monte_carlo_pi_batch(my_samples)
+            workers_used = "serial"
+            rank_local_points_in_circle = monte_carlo_pi_batch(my_samples, rank_seed_seq, kernel)
     else:
-        # Single process (no multiprocessing pool) or too few samples for effective batching
-        rank_local_points_in_circle = monte_carlo_pi_batch(my_samples)
+        # Single worker or too few samples for effective batching
+        workers_used = "serial"
+        rank_local_points_in_circle = monte_carlo_pi_batch(my_samples, rank_seed_seq, kernel)
     
     end_time_rank_work = time.time()
     
-    print(f"Rank {rank}: Processed {my_samples} samples. Found {rank_local_points_in_circle} points in circle. Time: {end_time_rank_work - start_time_rank_work:.3f}s", flush=True)
-
-    # Synchronize before gathering results
-    comm.Barrier()
+    print(f"Rank {rank}: Processed {my_samples} samples. Found {rank_local_points_in_circle} points in circle. Workers: {workers_used}. Time: {end_time_rank_work - start_time_rank_work:.3f}s", flush=True)
 
-    # Each rank sends a tuple: (points_in_circle_for_this_rank, samples_processed_by_this_rank)
-    rank_results = (rank_local_points_in_circle, my_samples)
-    all_rank_results = comm.gather(rank_results, root=0)
+    # Each rank contributes (points_in_circle_for_this_rank, samples_processed_by_this_rank)
+    totals = reduce_rank_results(comm, rank_local_points_in_circle, my_samples)
 
     if rank == 0:
-        total_points_in_circle_overall = 0
-        total_samples_overall = 0
-        for r_points, r_samples in all_rank_results:
-            total_points_in_circle_overall += r_points
-            total_samples_overall += r_samples
+        total_points_in_circle_overall = int(totals[0])
+        total_samples_overall = int(totals[1])
         
         estimated_pi = 0
         if total_samples_overall > 0:
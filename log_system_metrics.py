@@ -1,12 +1,53 @@
 import psutil
+import numpy as np
 import csv
 import time
 import argparse
 import datetime
 import os
+import signal
+import struct
 
-def log_system_metrics(output_file, interval):
-    """Logs system metrics (CPU, memory, disk I/O, network I/O) to a CSV file."""
+BYTES_TO_MB = 1.0 / (1024**2)
+BYTES_TO_GB = 1.0 / (1024**3)
+
+# Binary mode (--binary): a 16-byte header, then one packed little-endian 64-byte
+# record per interval. Load with BINARY_DTYPE:
+#   np.fromfile(path, offset=BINARY_HEADER.size, dtype=BINARY_DTYPE)
+BINARY_MAGIC = b'SYSMET01'
+BINARY_HEADER = struct.Struct('<8sq') # magic, memory_total_bytes
+BINARY_RECORD = struct.Struct('<qffqqqqqII')
+BINARY_RECORD_FIELDS = (
+    'timestamp_ns', # time.time_ns() at the end of the interval
+    'cpu_percent',
+    'memory_percent',
+    'memory_available_bytes',
+    'disk_read_bytes_interval',
+    'disk_write_bytes_interval',
+    'net_sent_bytes_interval',
+    'net_recv_bytes_interval',
+    'disk_read_count_interval',
+    'disk_write_count_interval',
+)
+# numpy view of BINARY_RECORD, derived from its struct format so the two cannot drift
+BINARY_DTYPE = np.dtype({
+    'names': BINARY_RECORD_FIELDS,
+    'formats': ['<' + {'q': 'i8', 'f': 'f4', 'I': 'u4'}[c] for c in BINARY_RECORD.format[1:]],
+})
+assert BINARY_DTYPE.itemsize == BINARY_RECORD.size
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def log_system_metrics(output_file, interval, flush_every=10, binary=False):
+    """
+    Logs system metrics (CPU, memory, disk I/O, network I/O) to a CSV file, or with
+    `binary` to fixed 64-byte BINARY_RECORD records that need no text parsing.
+    Rows are flushed every `flush_every` rows rather than after each one; SIGINT and
+    SIGTERM both stop the logger cleanly so buffered rows are still written.
+    Samples follow a fixed time.monotonic() schedule, so loggers on different nodes
+    do not drift apart over long runs.
+    """
     fieldnames = [
         'timestamp',
         'cpu_percent',
@@ -21,58 +62,90 @@ def log_system_metrics(output_file, interval):
         'net_recv_mb_interval'
     ]
 
+    # Route SIGINT and SIGTERM (e.g. pkill/scancel) through KeyboardInterrupt so the
+    # file is flushed and closed on exit. SIGINT is set explicitly: launched with
+    # `nohup ... &` from a non-interactive shell, the logger starts with it ignored.
+    signal.signal(signal.SIGINT, _raise_keyboard_interrupt)
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+
     print(f"Logging system metrics to {output_file} every {interval} seconds. This script will be terminated by the main job script.")
     try:
-        with open(output_file, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+        with open(output_file, 'wb' if binary else 'w', newline=None if binary else '') as out:
+            if binary:
+                out.write(BINARY_HEADER.pack(BINARY_MAGIC, psutil.virtual_memory().total))
+            else:
+                writer = csv.writer(out)
+                writer.writerow(fieldnames)
+            rows_since_flush = 0
 
-            # Initialize I/O counters before the loop
+            # Initialize CPU and I/O counters before the loop. The first non-blocking
+            # cpu_percent call only sets the baseline for the next one.
+            psutil.cpu_percent(interval=None)
             disk_io_before = psutil.disk_io_counters()
             net_io_before = psutil.net_io_counters()
+            next_sample_time = time.monotonic()
+            bytes_to_mb, bytes_to_gb = BYTES_TO_MB, BYTES_TO_GB # Local lookups in the loop
 
             while True:
-                # psutil.cpu_percent(interval=interval) blocks for 'interval' seconds
-                # and measures CPU utilization over this period.
-                current_cpu_percent = psutil.cpu_percent(interval=interval)
+                next_sample_time += interval
+                delay = next_sample_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_sample_time -= delay # Fell behind: restart the schedule from now
 
-                # Timestamp for the end of the measurement interval
-                timestamp = datetime.datetime.now().isoformat()
+                # CPU utilization since the previous call, i.e. over the last interval
+                current_cpu_percent = psutil.cpu_percent(interval=None)
 
                 # Memory (current state at end of interval)
                 mem = psutil.virtual_memory()
-                memory_total_gb = mem.total / (1024**3)
-                memory_available_gb = mem.available / (1024**3)
-                memory_percent = mem.percent
 
                 # Disk I/O (delta over the interval)
                 disk_io_after = psutil.disk_io_counters()
-                disk_read_mb_interval = (disk_io_after.read_bytes - disk_io_before.read_bytes) / (1024**2)
-                disk_write_mb_interval = (disk_io_after.write_bytes - disk_io_before.write_bytes) / (1024**2)
+                disk_read_bytes_interval = disk_io_after.read_bytes - disk_io_before.read_bytes
+                disk_write_bytes_interval = disk_io_after.write_bytes - disk_io_before.write_bytes
                 disk_read_count_interval = disk_io_after.read_count - disk_io_before.read_count
                 disk_write_count_interval = disk_io_after.write_count - disk_io_before.write_count
                 disk_io_before = disk_io_after # Update for next interval
 
                 # Network I/O (delta over the interval)
                 net_io_after = psutil.net_io_counters()
-                net_sent_mb_interval = (net_io_after.bytes_sent - net_io_before.bytes_sent) / (1024**2)
-                net_recv_mb_interval = (net_io_after.bytes_recv - net_io_before.bytes_recv) / (1024**2)
+                net_sent_bytes_interval = net_io_after.bytes_sent - net_io_before.bytes_sent
+                net_recv_bytes_interval = net_io_after.bytes_recv - net_io_before.bytes_recv
                 net_io_before = net_io_after # Update for next interval
 
-                writer.writerow({
-                    'timestamp': timestamp,
-                    'cpu_percent': current_cpu_percent,
-                    'memory_total_gb': round(memory_total_gb, 2),
-                    'memory_available_gb': round(memory_available_gb, 2),
-                    'memory_percent': memory_percent,
-                    'disk_read_mb_interval': round(disk_read_mb_interval, 2),
-                    'disk_write_mb_interval': round(disk_write_mb_interval, 2),
-                    'disk_read_count_interval': disk_read_count_interval,
-                    'disk_write_count_interval': disk_write_count_interval,
-                    'net_sent_mb_interval': round(net_sent_mb_interval, 2),
-                    'net_recv_mb_interval': round(net_recv_mb_interval, 2)
-                })
-                csvfile.flush() # Ensure data is written to disk
+                if binary:
+                    out.write(BINARY_RECORD.pack(
+                        time.time_ns(),
+                        current_cpu_percent,
+                        mem.percent,
+                        mem.available,
+                        disk_read_bytes_interval,
+                        disk_write_bytes_interval,
+                        net_sent_bytes_interval,
+                        net_recv_bytes_interval,
+                        max(0, disk_read_count_interval),
+                        max(0, disk_write_count_interval)
+                    ))
+                else:
+                    # Same order as fieldnames; fixed 2-decimal text instead of round()
+                    writer.writerow((
+                        datetime.datetime.now().isoformat(), # End of the measurement interval
+                        current_cpu_percent,
+                        f"{mem.total * bytes_to_gb:.2f}",
+                        f"{mem.available * bytes_to_gb:.2f}",
+                        mem.percent,
+                        f"{disk_read_bytes_interval * bytes_to_mb:.2f}",
+                        f"{disk_write_bytes_interval * bytes_to_mb:.2f}",
+                        disk_read_count_interval,
+                        disk_write_count_interval,
+                        f"{net_sent_bytes_interval * bytes_to_mb:.2f}",
+                        f"{net_recv_bytes_interval * bytes_to_mb:.2f}"
+                    ))
+                rows_since_flush += 1
+                if rows_since_flush >= flush_every:
+                    out.flush() # Periodically push buffered rows to disk
+                    rows_since_flush = 0
 
     except KeyboardInterrupt:
         print(f"Stopping system metrics logging for {output_file} due to KeyboardInterrupt.")
@@ -83,8 +156,10 @@ def log_system_metrics(output_file, interval):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Log system metrics (CPU, memory, disk I/O, network I/O).")
-    parser.add_argument("--output", type=str, required=True, help="Output CSV file path.")
+    parser.add_argument("--output", type=str, required=True, help="Output file path (CSV, or binary records with --binary).")
     parser.add_argument("--interval", type=int, default=5, help="Logging interval in seconds.")
+    parser.add_argument("--flush-every", type=int, default=10, help="Flush the output file to disk every N rows.")
+    parser.add_argument("--binary", action="store_true", help="Write fixed 64-byte binary records instead of CSV rows.")
     args = parser.parse_args()
 
     output_dir = os.path.dirname(args.output)
@@ -96,4 +171,4 @@ if __name__ == "__main__":
             # Exit if directory cannot be made, as file cannot be written
             exit(1)
             
-    log_system_metrics(args.output, args.interval)
+    log_system_metrics(args.output, args.interval, max(1, args.flush_every), args.binary)
@@ -0,0 +1,268 @@
+/*
+ * SIMD kernels for cpu_monte_carlo_pi.py, loaded through ctypes.
+ *
+ * Built by cpu_mcpi_job.sh once per ISA level, since the library is shared by
+ * nodes of possibly different CPU generations; cpu_monte_carlo_pi.py loads the
+ * best build the local CPU supports:
+ *   gcc -O3 -ffp-contract=off -mavx512f -mavx2 -shared -fPIC -o libmc_pi_kernel_avx512.so mc_pi_kernel.c
+ *   gcc -O3 -ffp-contract=off -mavx2 -shared -fPIC -o libmc_pi_kernel_avx2.so mc_pi_kernel.c
+ *   gcc -O3 -ffp-contract=off -shared -fPIC -o libmc_pi_kernel_scalar.so mc_pi_kernel.c
+ *
+ * Samples are FP32: the O(1/sqrt(N)) statistical error of the estimate is far
+ * larger than single precision rounding, and FP32 doubles the lane count.
+ * The vector width is picked at compile time from the ISA flags: AVX-512F (16 FP32
+ * lanes), AVX2 (8 lanes) or a scalar loop on anything else.
+ *
+ * count_in_circle_rng fuses generation and test: MC_LANES xoshiro256+
+ * streams live in vector registers and their floats are consumed straight
+ * away, so no sample array is written to memory. Every ISA variant walks the
+ * lanes in the same order and therefore draws the same stream for a seed.
+ * x*x + y*y is a plain multiply and add in every path, never an FMA, and
+ * -ffp-contract=off stops the compiler fusing it (-mavx512f implies FMA). FMA
+ * rounds once instead of twice, so a few boundary points would flip and --seed
+ * counts would depend on the build a node loaded; this way they all agree.
+ */
+#include <stddef.h>
+#include <stdint.h>
+
+#if defined(__AVX512F__) || defined(__AVX2__)
+#include <immintrin.h>
+#endif
+
+const char *mc_pi_kernel_isa(void)
+{
+#if defined(__AVX512F__)
+    return "avx512";
+#elif defined(__AVX2__)
+    return "avx2";
+#else
+    return "scalar";
+#endif
+}
+
+/* ---- xoshiro256+ (https://prng.di.unimi.it/), scalar helpers ---- */
+
+/* 64-bit generator lanes; each draw yields two FP32 samples per lane. */
+#define MC_LANES 8
+#define MC_BLOCK (2 * MC_LANES)
+
+static inline uint64_t rotl64(uint64_t x, int k)
+{
+    return (x << k) | (x >> (64 - k));
+}
+
+static uint64_t splitmix64(uint64_t *x)
+{
+    uint64_t z = (*x += UINT64_C(0x9E3779B97F4A7C15));
+    z = (z ^ (z >> 30)) * UINT64_C(0xBF58476D1CE4E5B9);
+    z = (z ^ (z >> 27)) * UINT64_C(0x94D049BB133111EB);
+    return z ^ (z >> 31);
+}
+
+static void xoshiro256_step(uint64_t s[4])
+{
+    uint64_t t = s[1] << 17;
+    s[2] ^= s[0];
+    s[3] ^= s[1];
+    s[1] ^= s[2];
+    s[0] ^= s[3];
+    s[2] ^= t;
+    s[3] = rotl64(s[3], 45);
+}
+
+/* Advances s by 2^128 steps, giving non-overlapping per-lane streams. */
+static void xoshiro256_jump(uint64_t s[4])
+{
+    static const uint64_t JUMP[4] = {
+        UINT64_C(0x180EC6D33CFD0ABA), UINT64_C(0xD5A61266F0C9392C),
+        UINT64_C(0xA9582618E03FC9AA), UINT64_C(0x39ABDC4529B1661C)
+    };
+    uint64_t j[4] = {0, 0, 0, 0};
+    for (int w = 0; w < 4; w++) {
+        for (int b = 0; b < 64; b++) {
+            if (JUMP[w] & (UINT64_C(1) << b)) {
+                j[0] ^= s[0];
+                j[1] ^= s[1];
+                j[2] ^= s[2];
+                j[3] ^= s[3];
+            }
+            xoshiro256_step(s);
+        }
+    }
+    for (int w = 0; w < 4; w++)
+        s[w] = j[w];
+}
+
+/* Lane-major state: s[word][lane]. */
+static void seed_lanes(uint64_t seed, uint64_t s[4][MC_LANES])
+{
+    uint64_t base[4];
+    for (int w = 0; w < 4; w++)
+        base[w] = splitmix64(&seed);
+    for (int l = 0; l < MC_LANES; l++) {
+        for (int w = 0; w < 4; w++)
+            s[w][l] = base[w];
+        xoshiro256_jump(base);
+    }
+}
+
+static inline uint64_t lane_next(uint64_t s[4][MC_LANES], int l)
+{
+    uint64_t st[4] = {s[0][l], s[1][l], s[2][l], s[3][l]};
+    uint64_t r = st[0] + st[3];
+    xoshiro256_step(st);
+    for (int w = 0; w < 4; w++)
+        s[w][l] = st[w];
+    return r;
+}
+
+/*
+ * Top 23 bits of a 32-bit half as a float in [0, 1). Both halves of a draw are
+ * used; only the lowest few bits of xoshiro256+ are weak and they are shifted out.
+ */
+static inline float unit_float(uint32_t bits)
+{
+    union { uint32_t u; float f; } v;
+    v.u = (bits >> 9) | UINT32_C(0x3F800000);
+    return v.f - 1.0f;
+}
+
+#if defined(__AVX512F__)
+/* One draw on 8 lanes, returned as 16 floats (element 2l + h is half h of lane l). */
+static inline __m512 next_unit_512(__m512i s[4])
+{
+    __m512i r = _mm512_add_epi64(s[0], s[3]);
+    __m512i t = _mm512_slli_epi64(s[1], 17);
+    s[2] = _mm512_xor_si512(s[2], s[0]);
+    s[3] = _mm512_xor_si512(s[3], s[1]);
+    s[1] = _mm512_xor_si512(s[1], s[2]);
+    s[0] = _mm512_xor_si512(s[0], s[3]);
+    s[2] = _mm512_xor_si512(s[2], t);
+    s[3] = _mm512_rol_epi64(s[3], 45);
+    __m512i bits = _mm512_or_si512(_mm512_srli_epi32(r, 9), _mm512_set1_epi32(0x3F800000));
+    return _mm512_sub_ps(_mm512_castsi512_ps(bits), _mm512_set1_ps(1.0f));
+}
+#elif defined(__AVX2__)
+/* One draw on 4 lanes, returned as 8 floats (element 2l + h is half h of lane l). */
+static inline __m256 next_unit_256(__m256i s[4])
+{
+    __m256i r = _mm256_add_epi64(s[0], s[3]);
+    __m256i t = _mm256_slli_epi64(s[1], 17);
+    s[2] = _mm256_xor_si256(s[2], s[0]);
+    s[3] = _mm256_xor_si256(s[3], s[1]);
+    s[1] = _mm256_xor_si256(s[1], s[2]);
+    s[0] = _mm256_xor_si256(s[0], s[3]);
+    s[2] = _mm256_xor_si256(s[2], t);
+    s[3] = _mm256_or_si256(_mm256_slli_epi64(s[3], 45), _mm256_srli_epi64(s[3], 19));
+    __m256i bits = _mm256_or_si256(_mm256_srli_epi32(r, 9), _mm256_set1_epi32(0x3F800000));
+    return _mm256_sub_ps(_mm256_castsi256_ps(bits), _mm256_set1_ps(1.0f));
+}
+#endif
+
+/* Number of points (x[i], y[i]) with x*x + y*y <= 1. */
+uint64_t count_in_circle(const float *x, const float *y, size_t n)
+{
+    uint64_t count = 0;
+    size_t i = 0;
+
+#if defined(__AVX512F__)
+    const __m512 one = _mm512_set1_ps(1.0f);
+    for (; i + 16 <= n; i += 16) {
+        __m512 X = _mm512_loadu_ps(x + i);
+        __m512 Y = _mm512_loadu_ps(y + i);
+        __m512 s = _mm512_add_ps(_mm512_mul_ps(X, X), _mm512_mul_ps(Y, Y));
+        __mmask16 m = _mm512_cmp_ps_mask(s, one, _CMP_LE_OQ);
+        count += (uint64_t)__builtin_popcount((unsigned)m);
+    }
+#elif defined(__AVX2__)
+    const __m256 one = _mm256_set1_ps(1.0f);
+    for (; i + 8 <= n; i += 8) {
+        __m256 X = _mm256_loadu_ps(x + i);
+        __m256 Y = _mm256_loadu_ps(y + i);
+        __m256 s = _mm256_add_ps(_mm256_mul_ps(X, X), _mm256_mul_ps(Y, Y));
+        int m = _mm256_movemask_ps(_mm256_cmp_ps(s, one, _CMP_LE_OQ));
+        count += (uint64_t)__builtin_popcount((unsigned)m);
+    }
+#endif
+
+    for (; i < n; i++)
+        count += (x[i] * x[i] + y[i] * y[i] <= 1.0f);
+    return count;
+}
+
+/*
+ * Draws n points from MC_LANES xoshiro256+ streams seeded from `seed` and
+ * returns how many satisfy x*x + y*y <= 1. Each lane draws an x word then a
+ * y word; their low and high halves give two samples.
+ */
+uint64_t count_in_circle_rng(uint64_t n, uint64_t seed)
+{
+    uint64_t s[4][MC_LANES];
+    uint64_t count = 0;
+    uint64_t i = 0;
+
+    seed_lanes(seed, s);
+
+#if defined(__AVX512F__)
+    {
+        __m512i v[4];
+        const __m512 one = _mm512_set1_ps(1.0f);
+        for (int w = 0; w < 4; w++)
+            v[w] = _mm512_loadu_si512((const void *)s[w]);
+        for (; i + MC_BLOCK <= n; i += MC_BLOCK) {
+            __m512 X = next_unit_512(v);
+            __m512 Y = next_unit_512(v);
+            __m512 r2 = _mm512_add_ps(_mm512_mul_ps(X, X), _mm512_mul_ps(Y, Y));
+            __mmask16 m = _mm512_cmp_ps_mask(r2, one, _CMP_LE_OQ);
+            count += (uint64_t)__builtin_popcount((unsigned)m);
+        }
+        for (int w = 0; w < 4; w++)
+            _mm512_storeu_si512((void *)s[w], v[w]);
+    }
+#elif defined(__AVX2__)
+    {
+        /* Lanes 0-3 in lo, 4-7 in hi */
+        __m256i lo[4], hi[4];
+        const __m256 one = _mm256_set1_ps(1.0f);
+        for (int w = 0; w < 4; w++) {
+            lo[w] = _mm256_loadu_si256((const __m256i *)&s[w][0]);
+            hi[w] = _mm256_loadu_si256((const __m256i *)&s[w][4]);
+        }
+        for (; i + MC_BLOCK <= n; i += MC_BLOCK) {
+            __m256 Xl = next_unit_256(lo);
+            __m256 Yl = next_unit_256(lo);
+            __m256 Xh = next_unit_256(hi);
+            __m256 Yh = next_unit_256(hi);
+            __m256 rl = _mm256_add_ps(_mm256_mul_ps(Xl, Xl), _mm256_mul_ps(Yl, Yl));
+            __m256 rh = _mm256_add_ps(_mm256_mul_ps(Xh, Xh), _mm256_mul_ps(Yh, Yh));
+            int m = _mm256_movemask_ps(_mm256_cmp_ps(rl, one, _CMP_LE_OQ))
+                  | (_mm256_movemask_ps(_mm256_cmp_ps(rh, one, _CMP_LE_OQ)) << 8);
+            count += (uint64_t)__builtin_popcount((unsigned)m);
+        }
+        for (int w = 0; w < 4; w++) {
+            _mm256_storeu_si256((__m256i *)&s[w][0], lo[w]);
+            _mm256_storeu_si256((__m256i *)&s[w][4], hi[w]);
+        }
+    }
+#endif
+
+    /* Scalar builds do all the work here; vector builds only the tail */
+    while (i < n) {
+        uint64_t samples = (n - i < MC_BLOCK) ? n - i : MC_BLOCK;
+        for (uint64_t k = 0; k < samples; k += 2) {
+            int l = (int)(k / 2);
+            uint64_t rx = lane_next(s, l);
+            uint64_t ry = lane_next(s, l);
+            float x = unit_float((uint32_t)rx);
+            float y = unit_float((uint32_t)ry);
+            count += (x * x + y * y <= 1.0f);
+            if (k + 1 < samples) {
+                x = unit_float((uint32_t)(rx >> 32));
+                y = unit_float((uint32_t)(ry >> 32));
+                count += (x * x + y * y <= 1.0f);
+            }
+        }
+        i += samples;
+    }
+    return count;
+}
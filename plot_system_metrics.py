@@ -1,18 +1,202 @@
-import matplotlib
-matplotlib.use('Agg') # Use non-interactive backend
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import argparse
 import os
-import glob # Added for finding files
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 
-def plot_single_node_metrics(csv_filepath, node_identifier, base_output_dir):
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# The only columns the plots read; anything else in the CSV is never parsed.
+PLOT_COLUMNS = [
+    'timestamp',
+    'cpu_percent',
+    'memory_percent',
+    'memory_available_gb',
+    'memory_total_gb',
+    'disk_read_mb_interval',
+    'disk_write_mb_interval',
+    'net_sent_mb_interval',
+    'net_recv_mb_interval'
+]
+
+# Logs longer than DECIMATE_THRESHOLD samples are thinned to about DECIMATE_TARGET
+# points before plotting; a 12x6 inch PNG has far fewer pixels than that anyway.
+DECIMATE_THRESHOLD = 4000
+DECIMATE_TARGET = 2000
+
+# Files over STREAM_THRESHOLD_BYTES are read STREAM_CHUNK_ROWS rows at a time and
+# decimated as they stream, so peak memory is one chunk rather than the whole log.
+STREAM_THRESHOLD_BYTES = 256 * 1024 * 1024
+STREAM_CHUNK_ROWS = 200_000
+
+# Output formats for --format. The decimated line plots are small as SVG/PDF, which
+# skip rasterization entirely; for PNG, line plots on a white background compress
+# fine at zlib level 1, which encodes much faster than libpng's default level 6.
+PLOT_FORMATS = ['svg', 'png', 'pdf']
+SAVE_KW = dict(dpi=90, pil_kwargs={'compress_level': 1})
+
+# Style shared by every figure, set once instead of per plot. figure.dpi matches the
+# save dpi so a canvas drawn for the background PNG writer has the final pixel size.
+PLOT_RC = {
+    'figure.figsize': (12, 6),
+    'figure.dpi': SAVE_KW['dpi'],
+    'axes.grid': True,
+}
+
+def _pyplot():
+    """
+    Imports matplotlib.pyplot on first use with the Agg backend and PLOT_RC applied, so
+    CLI error paths and callers that never plot skip matplotlib's startup cost.
+    """
+    import matplotlib
+    matplotlib.use('Agg') # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    plt.rcParams.update(PLOT_RC)
+    return plt
+
+def _read_metrics_csv(csv_filepath, wanted_cols):
+    """
+    Loads the `wanted_cols` of csv_filepath. With pyarrow, the file goes through Arrow's
+    multithreaded reader with 'timestamp' parsed as a typed timestamp and
+    'elapsed_time_s' computed in Arrow. Otherwise, or when Arrow rejects the file,
+    pd.read_csv(usecols=..., parse_dates=...) is used and the caller derives the
+    elapsed time; pandas pads short rows with NaN and leaves timestamps that do not
+    parse as text for the caller to convert (and report).
+    """
+    has_timestamp = 'timestamp' in wanted_cols
+    if PYARROW_AVAILABLE:
+        column_types = {'timestamp': pa.timestamp('us')} if has_timestamp else None
+        try:
+            table = pacsv.read_csv(csv_filepath, convert_options=pacsv.ConvertOptions(
+                include_columns=wanted_cols, column_types=column_types))
+        except pa.ArrowInvalid:
+            table = None # e.g. a last row truncated by a killed logger, or a bad timestamp
+        if table is not None:
+            if column_types and table.num_rows > 0:
+                ts = table['timestamp']
+                elapsed_us = pc.subtract(ts, ts[0]).cast(pa.int64())
+                table = table.append_column('elapsed_time_s', pc.divide(elapsed_us.cast(pa.float64()), 1e6))
+            return table.to_pandas()
+
+    return pd.read_csv(csv_filepath, usecols=wanted_cols, parse_dates=['timestamp'] if has_timestamp else False)
+
+def _stream_metrics_csv(csv_filepath, wanted_cols, chunksize=STREAM_CHUNK_ROWS):
+    """
+    Reads the `wanted_cols` of a metrics CSV too large to load whole, `chunksize` rows
+    at a time, keeping only
+    every stride-th row (stride estimated so about DECIMATE_TARGET rows remain).
+    Returns (thinned DataFrame, set of flat columns, whether memory_total_gb is
+    constant); the last two are computed over every row, as for in-memory files.
+    """
+    value_cols = [col for col in wanted_cols if col != 'timestamp']
+
+    # Estimate the row count from the newline density of the first MiB
+    with open(csv_filepath, 'rb') as f:
+        head = f.read(1 << 20)
+    est_rows = os.path.getsize(csv_filepath) * head.count(b'\n') // max(1, len(head))
+    stride = max(1, est_rows // DECIMATE_TARGET)
+
+    thin_chunks = []
+    col_min = dict.fromkeys(value_cols, np.inf)
+    col_max = dict.fromkeys(value_cols, -np.inf)
+    memory_totals = set() # Capped at 2 values: only "constant or not" matters
+    non_numeric_cols = set() # Never flat, as in _is_flat; the plot block reports them
+    rows_seen = 0
+    for chunk in pd.read_csv(csv_filepath, usecols=wanted_cols, chunksize=chunksize,
+                             parse_dates=['timestamp'] if 'timestamp' in wanted_cols else False):
+        for col in value_cols:
+            if col in non_numeric_cols:
+                continue
+            try:
+                values = chunk[col].to_numpy(dtype=float)
+            except (TypeError, ValueError):
+                non_numeric_cols.add(col)
+                continue
+            if not np.isnan(values).all():
+                col_min[col] = min(col_min[col], np.nanmin(values))
+                col_max[col] = max(col_max[col], np.nanmax(values))
+        if 'memory_total_gb' in chunk.columns and len(memory_totals) < 2:
+            memory_totals.update(chunk['memory_total_gb'].dropna().unique()[:2])
+        thin_chunks.append(chunk.iloc[-rows_seen % stride::stride]) # Keeps global rows 0, stride, 2*stride, ...
+        rows_seen += len(chunk)
+
+    df = pd.concat(thin_chunks, ignore_index=True) if thin_chunks else pd.DataFrame(columns=wanted_cols)
+    flat_cols = {col for col in value_cols if col not in non_numeric_cols and not col_min[col] < col_max[col]}
+    return df, flat_cols, len(memory_totals) == 1
+
+def _is_flat(series):
+    """True if series is all NaN or holds a single distinct value, i.e. its plot shows nothing."""
+    try:
+        values = series.to_numpy(dtype=float)
+    except (TypeError, ValueError):
+        return False # Non-numeric column: leave it to the plot block to report
+    if np.isnan(values).all():
+        return True
+    return np.nanmin(values) == np.nanmax(values) # Two reductions, no hashing or copies
+
+def _write_png(rgba, plot_path):
+    Image.fromarray(rgba).save(plot_path, dpi=(SAVE_KW['dpi'], SAVE_KW['dpi']), optimize=False, **SAVE_KW['pil_kwargs'])
+    print(f"Saved plot: {plot_path}")
+
+def _save_figure(fig, plot_path, save_executor, pending_saves):
+    """
+    Saves fig to plot_path in the format given by its extension. For PNG, renders fig
+    and hands a copy of its RGBA buffer to save_executor, whose threads do the encode
+    (zlib releases the GIL) while the caller draws the next plot into the same Figure;
+    the (plot_path, Future) pair is appended to pending_saves. SVG/PDF, and PNG
+    without Pillow, are written with a blocking fig.savefig.
+    """
+    is_png = plot_path.endswith('.png')
+    if is_png and PIL_AVAILABLE:
+        fig.canvas.draw()
+        rgba = np.asarray(fig.canvas.buffer_rgba()).copy()
+        pending_saves.append((plot_path, save_executor.submit(_write_png, rgba, plot_path)))
+        return
+    fig.savefig(plot_path, **(SAVE_KW if is_png else {}))
+    print(f"Saved plot: {plot_path}")
+
+def _line_plot(fig, ax, x, series, title, ylabel, plot_path, save_executor, pending_saves):
+    """
+    Redraws the reusable `ax` of `fig` with one line per (y, label) pair in `series`
+    against x (elapsed seconds) and saves the figure to plot_path via _save_figure.
+    """
+    ax.clear()
+    for y, label in series:
+        ax.plot(x, y, label=label)
+    ax.set_xlabel('Time (seconds)')
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.legend()
+    _save_figure(fig, plot_path, save_executor, pending_saves)
+
+def plot_single_node_metrics(csv_filepath, node_identifier, base_output_dir, fmt='svg'):
     """
     Reads system metrics from a single CSV file and generates plots for that node.
-    Saves plots in a subdirectory named after the node_identifier within base_output_dir.
+    Saves plots as `fmt` files (one of PLOT_FORMATS) in a subdirectory named after the
+    node_identifier within base_output_dir.
     """
+    flat_cols = memory_total_constant = None
     try:
-        df = pd.read_csv(csv_filepath)
+        # Zero-row header probe: only the PLOT_COLUMNS it lists are parsed
+        header = pd.read_csv(csv_filepath, nrows=0).columns.tolist()
+        wanted_cols = [col for col in PLOT_COLUMNS if col in header]
+        if os.path.getsize(csv_filepath) > STREAM_THRESHOLD_BYTES:
+            df, flat_cols, memory_total_constant = _stream_metrics_csv(csv_filepath, wanted_cols)
+        else:
+            df = _read_metrics_csv(csv_filepath, wanted_cols)
     except FileNotFoundError:
         print(f"Error: System metrics file not found at {csv_filepath}")
         return 0 # Return count of plots generated
@@ -28,151 +212,192 @@ def plot_single_node_metrics(csv_filepath, node_identifier, base_output_dir):
         return 0
 
     if 'timestamp' not in df.columns:
-        print(f"Error: 'timestamp' column not found in {csv_filepath}. Available columns: {df.columns.tolist()}")
+        print(f"Error: 'timestamp' column not found in {csv_filepath}. Available columns: {header}")
         return 0
 
     try:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df['elapsed_time_s'] = (df['timestamp'] - df['timestamp'].iloc[0]).dt.total_seconds()
+        # Bare ndarray of seconds since the first sample, shared by every plot below
+        if 'elapsed_time_s' in df.columns: # Already computed by the Arrow reader
+            elapsed = df['elapsed_time_s'].to_numpy()
+        else:
+            timestamps = df['timestamp']
+            if not pd.api.types.is_datetime64_any_dtype(timestamps): # Left as text by the reader
+                timestamps = pd.to_datetime(timestamps)
+            ts = timestamps.to_numpy(dtype='datetime64[ns]')
+            ns = ts.view('int64')
+            elapsed = (ns - ns[0]) * 1e-9
+            elapsed[np.isnat(ts) | np.isnat(ts[0])] = np.nan # NaT views as INT64_MIN
     except Exception as e:
         print(f"Error processing timestamp column in {csv_filepath}: {e}. Skipping plots that require time.")
         return 0
 
+    if flat_cols is None: # Streamed files were already summarized while reading
+        # Checked on every sample, before decimation can drop a lone spike or a change
+        flat_cols = {col for col in PLOT_COLUMNS[1:] if col in df.columns and _is_flat(df[col])}
+        memory_total_constant = 'memory_total_gb' in flat_cols and df['memory_total_gb'].notna().any()
+
+    if len(elapsed) > DECIMATE_THRESHOLD:
+        stride = max(1, len(elapsed) // DECIMATE_TARGET)
+        elapsed = elapsed[::stride]
+        df = df.iloc[::stride]
+
+    # Plain ndarrays for the plot blocks, extracted once instead of per Series access
+    arr = {col: df[col].to_numpy() for col in df.columns if col not in ('timestamp', 'elapsed_time_s')}
+
     # Create a specific output directory for this node's plots
     node_plot_dir = os.path.join(base_output_dir, f"plots_{node_identifier}")
     os.makedirs(node_plot_dir, exist_ok=True)
 
     plots_generated_count = 0
+    suffix = f' ({node_identifier})' # Shared by every title and label below
+    file_suffix = f'_{node_identifier}.{fmt}'
+    pending_saves = [] # (plot_path, Future) for PNGs still being encoded
+    save_executor = ThreadPoolExecutor(max_workers=2)
 
-    # CPU Utilization
-    if 'cpu_percent' in df.columns:
-        try:
-            plt.figure(figsize=(12, 6))
-            plt.plot(df['elapsed_time_s'], df['cpu_percent'], label=f'CPU Utilization ({node_identifier})')
-            plt.xlabel('Time (seconds)')
-            plt.ylabel('CPU Utilization (%)')
-            plt.title(f'CPU Utilization Over Time ({node_identifier})')
-            plt.legend()
-            plt.grid(True)
-            plot_path = os.path.join(node_plot_dir, f'system_cpu_utilization_{node_identifier}.png')
-            plt.savefig(plot_path)
-            plt.close()
-            print(f"Saved plot: {plot_path}")
-            plots_generated_count += 1
-        except Exception as e:
-            print(f"Could not generate plot for cpu_percent on {node_identifier}: {e}")
-    else:
-        print(f"Column 'cpu_percent' not found in {csv_filepath}, skipping CPU plot for {node_identifier}.")
+    plt = _pyplot()
+    # One Figure for all single-axis line plots and one for the twin-axis memory
+    # plot, redrawn per metric instead of building and tearing down a Figure each time.
+    fig, ax = plt.subplots(layout='constrained')
+    fig_mem, ax_mem = plt.subplots(layout='constrained')
+    ax_mem.grid(False) # Only the twin (available GB) axis draws grid lines
+    ax_mem2 = ax_mem.twinx()
+    try:
+        # CPU Utilization
+        if 'cpu_percent' in flat_cols:
+            print(f"No variation in cpu_percent for {node_identifier}, skipping CPU plot.")
+        elif 'cpu_percent' in arr:
+            try:
+                plot_path = os.path.join(node_plot_dir, 'system_cpu_utilization' + file_suffix)
+                _line_plot(fig, ax, elapsed,
+                           [(arr['cpu_percent'], 'CPU Utilization' + suffix)],
+                           'CPU Utilization Over Time' + suffix, 'CPU Utilization (%)', plot_path, save_executor, pending_saves)
+                plots_generated_count += 1
+            except Exception as e:
+                print(f"Could not generate plot for cpu_percent on {node_identifier}: {e}")
+        else:
+            print(f"Column 'cpu_percent' not found in {csv_filepath}, skipping CPU plot for {node_identifier}.")
 
-    # Memory Usage
-    if 'memory_percent' in df.columns and 'memory_available_gb' in df.columns and 'memory_total_gb' in df.columns:
-        try:
-            fig, ax1 = plt.subplots(figsize=(12, 6))
-            color = 'tab:red'
-            ax1.set_xlabel('Time (seconds)')
-            ax1.set_ylabel(f'Memory Utilization (%) - {node_identifier}', color=color)
-            ax1.plot(df['elapsed_time_s'], df['memory_percent'], color=color, label=f'Memory Utilization (%) ({node_identifier})')
-            ax1.tick_params(axis='y', labelcolor=color)
-            ax1.legend(loc='upper left')
-
-            ax2 = ax1.twinx()
-            color = 'tab:blue'
-            ax2.set_ylabel(f'Memory Available (GB) - {node_identifier}', color=color)
-            ax2.plot(df['elapsed_time_s'], df['memory_available_gb'], color=color, linestyle='--', label=f'Memory Available (GB) ({node_identifier})')
-            if df['memory_total_gb'].nunique() == 1:
-                 total_mem_gb = df['memory_total_gb'].iloc[0]
-                 ax2.axhline(y=total_mem_gb, color='tab:green', linestyle=':', label=f'Total Memory ({total_mem_gb:.2f} GB) ({node_identifier})')
-            ax2.tick_params(axis='y', labelcolor=color)
-            ax2.legend(loc='upper right')
-
-            fig.tight_layout()
-            plt.title(f'System Memory Usage Over Time ({node_identifier})')
-            plt.grid(True)
-            plot_path = os.path.join(node_plot_dir, f'system_memory_usage_{node_identifier}.png')
-            plt.savefig(plot_path)
-            plt.close()
-            print(f"Saved plot: {plot_path}")
-            plots_generated_count += 1
-        except Exception as e:
-            print(f"Could not generate plot for memory usage on {node_identifier}: {e}")
-    else:
-        print(f"Memory columns not found in {csv_filepath}, skipping memory plot for {node_identifier}.")
+        # Memory Usage
+        if flat_cols.issuperset(('memory_percent', 'memory_available_gb')):
+            print(f"No variation in memory columns for {node_identifier}, skipping memory plot.")
+        elif 'memory_percent' in arr and 'memory_available_gb' in arr and 'memory_total_gb' in arr:
+            try:
+                ax1, ax2 = ax_mem, ax_mem2
+                color = 'tab:red'
+                ax1.set_xlabel('Time (seconds)')
+                ax1.set_ylabel('Memory Utilization (%) - ' + node_identifier, color=color)
+                ax1.plot(elapsed, arr['memory_percent'], color=color, label='Memory Utilization (%)' + suffix)
+                ax1.tick_params(axis='y', labelcolor=color)
+                ax1.legend(loc='upper left')
 
-    # Disk I/O Throughput
-    if 'disk_read_mb_interval' in df.columns and 'disk_write_mb_interval' in df.columns:
-        try:
-            plt.figure(figsize=(12, 6))
-            plt.plot(df['elapsed_time_s'], df['disk_read_mb_interval'], label=f'Disk Read (MB/interval) ({node_identifier})')
-            plt.plot(df['elapsed_time_s'], df['disk_write_mb_interval'], label=f'Disk Write (MB/interval) ({node_identifier})')
-            plt.xlabel('Time (seconds)')
-            plt.ylabel('Data Transferred (MB per interval)')
-            plt.title(f'Disk I/O Throughput Over Time ({node_identifier})')
-            plt.legend()
-            plt.grid(True)
-            plot_path = os.path.join(node_plot_dir, f'system_disk_io_throughput_{node_identifier}.png')
-            plt.savefig(plot_path)
-            plt.close()
-            print(f"Saved plot: {plot_path}")
-            plots_generated_count += 1
-        except Exception as e:
-            print(f"Could not generate plot for disk I/O throughput on {node_identifier}: {e}")
-    else:
-        print(f"Disk I/O columns not found in {csv_filepath}, skipping disk I/O throughput plot for {node_identifier}.")
+                color = 'tab:blue'
+                ax2.set_ylabel('Memory Available (GB) - ' + node_identifier, color=color)
+                ax2.plot(elapsed, arr['memory_available_gb'], color=color, linestyle='--', label='Memory Available (GB)' + suffix)
+                if memory_total_constant:
+                     total_mem_gb = np.nanmax(arr['memory_total_gb'])
+                     ax2.axhline(y=total_mem_gb, color='tab:green', linestyle=':', label=f'Total Memory ({total_mem_gb:.2f} GB)' + suffix)
+                ax2.tick_params(axis='y', labelcolor=color)
+                ax2.legend(loc='upper right')
 
-    # Network I/O Throughput
-    if 'net_sent_mb_interval' in df.columns and 'net_recv_mb_interval' in df.columns:
-        try:
-            plt.figure(figsize=(12, 6))
-            plt.plot(df['elapsed_time_s'], df['net_sent_mb_interval'], label=f'Network Sent (MB/interval) ({node_identifier})')
-            plt.plot(df['elapsed_time_s'], df['net_recv_mb_interval'], label=f'Network Received (MB/interval) ({node_identifier})')
-            plt.xlabel('Time (seconds)')
-            plt.ylabel('Data Transferred (MB per interval)')
-            plt.title(f'Network I/O Throughput Over Time ({node_identifier})')
-            plt.legend()
-            plt.grid(True)
-            plot_path = os.path.join(node_plot_dir, f'system_network_io_throughput_{node_identifier}.png')
-            plt.savefig(plot_path)
-            plt.close()
-            print(f"Saved plot: {plot_path}")
-            plots_generated_count += 1
-        except Exception as e:
-            print(f"Could not generate plot for network I/O throughput on {node_identifier}: {e}")
-    else:
-        print(f"Network I/O columns not found in {csv_filepath}, skipping network I/O throughput plot for {node_identifier}.")
+                ax2.set_title('System Memory Usage Over Time' + suffix)
+                plot_path = os.path.join(node_plot_dir, 'system_memory_usage' + file_suffix)
+                _save_figure(fig_mem, plot_path, save_executor, pending_saves)
+                plots_generated_count += 1
+            except Exception as e:
+                print(f"Could not generate plot for memory usage on {node_identifier}: {e}")
+        else:
+            print(f"Memory columns not found in {csv_filepath}, skipping memory plot for {node_identifier}.")
+
+        # Disk I/O Throughput
+        if flat_cols.issuperset(('disk_read_mb_interval', 'disk_write_mb_interval')):
+            print(f"No variation in disk I/O columns for {node_identifier}, skipping disk I/O throughput plot.")
+        elif 'disk_read_mb_interval' in arr and 'disk_write_mb_interval' in arr:
+            try:
+                plot_path = os.path.join(node_plot_dir, 'system_disk_io_throughput' + file_suffix)
+                _line_plot(fig, ax, elapsed,
+                           [(arr['disk_read_mb_interval'], 'Disk Read (MB/interval)' + suffix),
+                            (arr['disk_write_mb_interval'], 'Disk Write (MB/interval)' + suffix)],
+                           'Disk I/O Throughput Over Time' + suffix, 'Data Transferred (MB per interval)', plot_path, save_executor, pending_saves)
+                plots_generated_count += 1
+            except Exception as e:
+                print(f"Could not generate plot for disk I/O throughput on {node_identifier}: {e}")
+        else:
+            print(f"Disk I/O columns not found in {csv_filepath}, skipping disk I/O throughput plot for {node_identifier}.")
+
+        # Network I/O Throughput
+        if flat_cols.issuperset(('net_sent_mb_interval', 'net_recv_mb_interval')):
+            print(f"No variation in network I/O columns for {node_identifier}, skipping network I/O throughput plot.")
+        elif 'net_sent_mb_interval' in arr and 'net_recv_mb_interval' in arr:
+            try:
+                plot_path = os.path.join(node_plot_dir, 'system_network_io_throughput' + file_suffix)
+                _line_plot(fig, ax, elapsed,
+                           [(arr['net_sent_mb_interval'], 'Network Sent (MB/interval)' + suffix),
+                            (arr['net_recv_mb_interval'], 'Network Received (MB/interval)' + suffix)],
+                           'Network I/O Throughput Over Time' + suffix, 'Data Transferred (MB per interval)', plot_path, save_executor, pending_saves)
+                plots_generated_count += 1
+            except Exception as e:
+                print(f"Could not generate plot for network I/O throughput on {node_identifier}: {e}")
+        else:
+            print(f"Network I/O columns not found in {csv_filepath}, skipping network I/O throughput plot for {node_identifier}.")
+    finally:
+        plt.close(fig)
+        plt.close(fig_mem)
+        save_executor.shutdown(wait=True)
+
+    for plot_path, future in pending_saves:
+        if future.exception() is not None:
+            print(f"Could not save plot {plot_path}: {future.exception()}")
+            plots_generated_count -= 1
     
     return plots_generated_count
 
+def _process_one(csv_filepath, base_dir, fmt):
+    """
+    Pool worker: derives the node identifier from csv_filepath's name and plots that
+    node's metrics under base_dir as `fmt` files. Returns the number of plots generated.
+    """
+    # Extract node identifier from filename, assuming format like "system_metrics_NODENAME.csv"
+    # or "system_metrics_NODENAME_anything_else.csv"
+    filename = os.path.basename(csv_filepath)
+    if filename.startswith("system_metrics_") and filename.endswith(".csv"):
+        # remove "system_metrics_" prefix and ".csv" suffix
+        identifier_part = filename[len("system_metrics_"):-len(".csv")]
+        # If there are other parts separated by underscore, take the first one as the primary node identifier
+        node_identifier = identifier_part.split('_')[0] 
+    else:
+        node_identifier = "unknown_node" # Fallback
+        
+    print(f"Processing metrics for {node_identifier} from file: {csv_filepath}")
+    # base_dir is the directory holding the CSV files; plot subdirectories go under it
+    return plot_single_node_metrics(csv_filepath, node_identifier, base_dir, fmt)
+
 def main():
     parser = argparse.ArgumentParser(description='Plot system metrics from CSV log files in a directory.')
     parser.add_argument('metrics_directory', type=str, help='Path to the directory containing system metrics CSV files (e.g., system_metrics_HOSTNAME.csv).')
+    parser.add_argument('--format', type=str, default='svg', choices=PLOT_FORMATS, help='Output format for the plots (default: svg).')
     args = parser.parse_args()
 
     if not os.path.isdir(args.metrics_directory):
         print(f"Error: The directory '{args.metrics_directory}' does not exist.")
         return
 
-    csv_files = glob.glob(os.path.join(args.metrics_directory, 'system_metrics_*.csv'))
+    csv_files = [entry.path for entry in os.scandir(args.metrics_directory)
+                 if entry.is_file() and entry.name.startswith('system_metrics_') and entry.name.endswith('.csv')]
     
     if not csv_files:
         print(f"No system_metrics_*.csv files found in {args.metrics_directory}.")
         return
 
-    total_plots_generated = 0
-    for csv_filepath in csv_files:
-        # Extract node identifier from filename, assuming format like "system_metrics_NODENAME.csv"
-        # or "system_metrics_NODENAME_anything_else.csv"
-        filename = os.path.basename(csv_filepath)
-        if filename.startswith("system_metrics_") and filename.endswith(".csv"):
-            # remove "system_metrics_" prefix and ".csv" suffix
-            identifier_part = filename[len("system_metrics_"):-len(".csv")]
-            # If there are other parts separated by underscore, take the first one as the primary node identifier
-            node_identifier = identifier_part.split('_')[0] 
-        else:
-            node_identifier = "unknown_node" # Fallback
-        
-        print(f"Processing metrics for {node_identifier} from file: {csv_filepath}")
-        # Pass the parent directory of the CSV files as the base for plot subdirectories
-        total_plots_generated += plot_single_node_metrics(csv_filepath, node_identifier, args.metrics_directory)
+    # Each node's CSV is independent: render them in separate processes, each with
+    # its own interpreter and Agg canvases, and add up the per-file plot counts.
+    # Largest files are handed out first, one at a time, so one long log is not left
+    # running alone at the end while the other workers sit idle.
+    csv_files.sort(key=os.path.getsize, reverse=True)
+    num_processes = min(len(csv_files), os.cpu_count() or 1)
+    with multiprocessing.Pool(processes=num_processes) as pool:
+        plot_counts = pool.starmap(_process_one, [(csv_filepath, args.metrics_directory, args.format) for csv_filepath in csv_files],
+                                   chunksize=1)
+    total_plots_generated = sum(plot_counts)
 
     if total_plots_generated > 0:
         print(f"All plotting finished. Total plots generated: {total_plots_generated}.")